@@ -1,6 +1,6 @@
-import re
 import time
 import threading
+from ipaddress import IPv4Address
 
 from whiptailtui import WhiptailMessageBox, WhiptailMenuBox, \
 WhiptailMenuItem, WhiptailYesNo, WhiptailRadioListBox, WhiptailInfoBox, \
@@ -8,15 +8,12 @@ WhiptailTextBox, WhiptailInputBox, WhiptailCheckListBox, WhiptailSelectItem, \
 WhiptailFormItem, WhiptailFormBox, WhiptailGaugeBox
 
 def validate_ip(ip : str):
-    # Define a regular expression pattern for IP address validation
-    pattern = r'^(\d{1,3}\.){3}\d{1,3}$'
-    if re.match(pattern, ip):
-        # Split the IP address into its components
-        octets = ip.split('.')
-        # Check if each octet is a valid number (0-255)
-        if all(0 <= int(octet) <= 255 for octet in octets):
-            return True
-    return False
+    # parse and range-check the address in one call
+    try:
+        IPv4Address(ip)
+        return True
+    except ValueError:
+        return False
 
 WhiptailMessageBox(
     message = "message box content",
@@ -3,10 +3,23 @@
 #  whiptail_base.py
 
 from __future__ import annotations
-from typing import Optional, Sequence, Type
+from typing import Optional, Sequence, Any, TYPE_CHECKING
 from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
 import subprocess
 import shutil
+import os
+import sys
+import threading
+
+if sys.version_info >= (3, 11):
+    from typing import Self
+elif TYPE_CHECKING:
+    # typing.Self is only available since python 3.11, type checkers ship typing_extensions
+    from typing_extensions import Self
+else:
+    # keep Self resolvable at runtime without depending on typing_extensions
+    Self = Any
 
 whiptail_box_name_list = [
     'msgbox',
@@ -20,6 +33,29 @@ whiptail_box_name_list = [
     'radiolist',
     'gauge'
 ]
+_VALID_BOXES : frozenset[str] = frozenset(whiptail_box_name_list)
+
+_executor : Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    worker running dialogs shown by ``show_async``, created once on first use.
+    a single worker keeps async dialogs from drawing on the terminal at the same time
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='whiptail-spawn')
+        return _executor
+
+# resolve whiptail executable once, an absolute path saves the PATH search on every spawn
+_WHIPTAIL : str = shutil.which('whiptail') or 'whiptail'
+
+# CPython before 3.13 only spawns with posix_spawn() instead of fork()+exec() when close_fds is off,
+# the trade-off is that descriptors inherited as inheritable (e.g. from the parent process) leak into
+# whiptail. 3.13+ uses posix_spawn() with close_fds on, so keep the safe default there
+_SPAWN_OPTIONS : dict[str, bool] = {'close_fds': False} if sys.version_info < (3, 13) else {}
 
 POSITIVE_RETURN_CODE : int = 0
 NEGATIVE_RETURN_CODE : int = 1
@@ -49,12 +85,25 @@ class Response(namedtuple("__BaseResponse", "returncode value")):
         :param returncode: The returncode.
         :param value: The value returned from the dialog.
         """
-        if isinstance(value, bytes):
-            val = value.decode("UTF-8")
+        if not value:
+            # msgbox, yesno, infobox... write nothing, skip decoding
+            val = ""
+        elif isinstance(value, bytes):
+            val = value.decode("UTF-8", errors="replace")
         else:
             val = value
         return super().__new__(cls, returncode, val)
 
+    @classmethod
+    def from_bytes(cls, returncode: int, value: bytes) -> Response:
+        """
+        Create a new instance of :class:`~.Response` from the raw bytes read from whiptail.
+
+        :param returncode: The returncode.
+        :param value: The bytes returned from the dialog.
+        """
+        return tuple.__new__(cls, (returncode, value.decode("UTF-8", errors="replace") if value else ""))
+
 
 
 class WhiptailBase:
@@ -91,6 +140,36 @@ class WhiptailBase:
         --radiolist <text> <height> <width> <listheight> [tag item status]...
         --gauge <text> <height> <width> <percent>   
     """
+    __slots__ = (
+        'clear_on_exit', 'default_no', 'default_item', 'full_buttons', 'no_cancel',
+        'yes_button', 'no_button', 'ok_button', 'cancel_button', 'no_item', 'no_tags',
+        'separate_output', 'title', 'backtitle', 'scrolltext', 'topleft', 'term_env',
+        '_box', '_text', '_height', '_width', '_argv_tail', '_box_extra_args', 'process'
+    )
+
+    # (attribute, option) of whiptail options enabled by a bool attribute
+    _BOOL_FLAGS = (
+        ('clear_on_exit',   '--clear'),
+        ('default_no',      '--defaultno'),
+        ('full_buttons',    '--fullbuttons'),
+        ('no_cancel',       '--nocancel'),
+        ('no_item',         '--noitem'),
+        ('no_tags',         '--notags'),
+        ('separate_output', '--separate-output'),
+        ('scrolltext',      '--scrolltext'),
+        ('topleft',         '--topleft'),
+    )
+    # (attribute, option) of whiptail options taking the Optional[str] attribute as value
+    _STR_FLAGS = (
+        ('default_item',    '--default-item'),
+        ('yes_button',      '--yes-button'),
+        ('no_button',       '--no-button'),
+        ('ok_button',       '--ok-button'),
+        ('cancel_button',   '--cancel-button'),
+        ('title',           '--title'),
+        ('backtitle',       '--backtitle'),
+    )
+
     def __init__(self, box : str, text : str, height : Optional[int], width : Optional[int]):
         # init all whiptail attributes to False or None
         self.clear_on_exit  : bool          = False
@@ -116,31 +195,91 @@ class WhiptailBase:
         self.text        : str           = text
         self.height      : int           = height
         self.width       : int           = width
-        self.box_extra_args : Sequence[str] = ()
+        # built lazily by build_box_extra_args() on first use
+        self._box_extra_args : Optional[Sequence[str]] = None
         self.process = None
-        if box not in whiptail_box_name_list:
+        if self.height is None or self.width is None:
+            # probe the terminal once for both default height and width
+            terminal_size = shutil.get_terminal_size()
+            if self.height is None:
+                self.height = self.get_default_height(terminal_size)
+            if self.width is None:
+                self.width = self.get_default_width(terminal_size)
+
+    # box, text, height and width are stringified into the cached argv tail, reset it on change
+    @property
+    def box(self) -> str:
+        return self._box
+
+    @box.setter
+    def box(self, box : str) -> None:
+        if box not in _VALID_BOXES:
             raise Exception("invalid whiptail box name: {}".format(box))
-        if self.height is None:
-            self.height = self.get_default_height()
-        if self.width is None:
-            self.width = self.get_default_width()
+        self._box = box
+        self._argv_tail = None
+
+    @property
+    def text(self) -> str:
+        return self._text
+
+    @text.setter
+    def text(self, text : str) -> None:
+        self._text = text
+        self._argv_tail = None
+
+    @property
+    def height(self) -> int:
+        return self._height
+
+    @height.setter
+    def height(self, height : int) -> None:
+        self._height = height
+        self._argv_tail = None
+
+    @property
+    def width(self) -> int:
+        return self._width
+
+    @width.setter
+    def width(self, width : int) -> None:
+        self._width = width
+        self._argv_tail = None
+
+    @property
+    def box_extra_args(self) -> Sequence[str]:
+        """
+        box specific args following ``<text> <height> <width>``, built on first use
+        """
+        if self._box_extra_args is None:
+            self._box_extra_args = self.build_box_extra_args()
+        return self._box_extra_args
+
+    @box_extra_args.setter
+    def box_extra_args(self, box_extra_args : Sequence[str]) -> None:
+        self._box_extra_args = box_extra_args
 
-    def get_default_height(self) -> int:
+    def build_box_extra_args(self) -> list[str]:
+        """
+        subclass need to override this method if the box takes extra args
+        """
+        return []
+
+    def get_default_height(self, terminal_size : Optional[os.terminal_size] = None) -> int:
         """
         calculate default height of dialog box using terminal size if height is not specified
         """
-        _, height = shutil.get_terminal_size()
+        _, height = terminal_size or shutil.get_terminal_size()
         height -= 2
         height -= (height % 5)
         return height
 
-    def get_default_width(self) -> int:
+    def get_default_width(self, terminal_size : Optional[os.terminal_size] = None) -> int:
         """
         calculate default width of dialog box using terminal size if width is not specified
         """
-        width, _ = shutil.get_terminal_size()
+        width, _ = terminal_size or shutil.get_terminal_size()
         width -= 2
-        hewidthight -= (width % 5)
+        width -= (width % 5)
         return width
 
     def get_default_list_height(self) -> int:
@@ -156,65 +295,52 @@ class WhiptailBase:
         Any attribute of type Optional[str] and is not None and
         Any attribute of type bool if True should be put in list
         """
-        whiptail_args = []
-        if self.clear_on_exit:
-            whiptail_args.append("--clear")
-        if self.default_no:
-            whiptail_args.append("--defaultno")
-        if self.full_buttons:
-            whiptail_args.append("--fullbuttons")
-        if self.no_cancel:
-            whiptail_args.append("--nocancel")
-        if self.no_item:
-            whiptail_args.append("--noitem")
-        if self.no_tags:
-            whiptail_args.append("--notags")
-        if self.separate_output:
-            whiptail_args.append("--separate-output")
-        if self.scrolltext:
-            whiptail_args.append("--scrolltext")
-        if self.topleft:
-            whiptail_args.append("--topleft")
-        if self.default_item is not None:
-            whiptail_args += ["--default-item", self.default_item]
-        if self.yes_button is not None:
-            whiptail_args += ["--yes-button", self.yes_button]
-        if self.no_button is not None:
-            whiptail_args += ["--no-button", self.no_button]
-        if self.ok_button is not None:
-            whiptail_args += ["--ok-button", self.ok_button]
-        if self.cancel_button is not None:
-            whiptail_args += ["--cancel-button", self.cancel_button]
-        if self.title is not None:
-            whiptail_args += ["--title", self.title]
-        if self.backtitle is not None:
-            whiptail_args += ["--backtitle", self.backtitle]
+        whiptail_args = [option for attr, option in self._BOOL_FLAGS if getattr(self, attr)]
+        for attr, option in self._STR_FLAGS:
+            value = getattr(self, attr)
+            if value is not None:
+                whiptail_args += (option, value)
         return whiptail_args
     
-    def run(self) -> Response:
+    def build_command(self) -> list[str]:
         """
         box command all need text, height and width
-        whiptail command can be split as: [TERM=ansi] whiptail [whiptail args...] --<box> <text> <height> <width> [box extra args...]
+        whiptail command can be split as: whiptail [whiptail args...] --<box> <text> <height> <width> [box extra args...]
         whiptail args should be extract from whiptail attributes while box extra args should be extrat from box attributes
         """
-        whiptail_args = self.build_whiptail_args()
-        cmd = []
-        if (self.term_env is not None):
-            cmd = ["TERM={}".format(self.term_env)]
-        cmd += ["whiptail"]
-        cmd += [*list(whiptail_args)]
-        cmd += [
-            "--{}".format(self.box),
-            "--",
-            str(self.text),
-            str(self.height),
-            str(self.width),
-            *list(self.box_extra_args)
-        ]
-        process = subprocess.Popen(cmd, stderr=subprocess.PIPE)
-        _, err = process.communicate()
-        # err is the selected key str
-        return Response(process.returncode, err)
+        argv_tail = self._argv_tail
+        if argv_tail is None:
+            argv_tail = self._argv_tail = (f"--{self._box}", "--", str(self._text), str(self._height), str(self._width))
+        return [_WHIPTAIL, *self.build_whiptail_args(), *argv_tail, *self.box_extra_args]
+
+    def build_env(self) -> Optional[dict[str, str]]:
+        """
+        environment of the whiptail process, ``TERM`` is overridden if ``term_env`` is configured
+        """
+        if self.term_env is None:
+            # inherit the environment as is
+            return None
+        # copy the live environment on every spawn, os.environ may change between shows
+        return {**os.environ, 'TERM': self.term_env}
+
+    def run(self) -> Response:
+        """
+        run the whiptail command and wait for the dialog to exit
+        """
+        result = subprocess.run(self.build_command(), stderr=subprocess.PIPE, env=self.build_env(),
+            **_SPAWN_OPTIONS)
+        # stderr is the selected key str
+        return Response.from_bytes(result.returncode, result.stderr)
+
+    def spawn_streaming(self) -> subprocess.Popen:
+        """
+        spawn a single long-lived whiptail process whose stdin stays open,
+        boxes like gauge are fed through the pipe instead of re-spawning whiptail
+        """
+        self.process = subprocess.Popen(self.build_command(),
+            stdin=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0, env=self.build_env(),
+            **_SPAWN_OPTIONS)
+        return self.process
 
     def show(self) -> Response:
         """
@@ -231,6 +357,18 @@ class WhiptailBase:
             raise Exception(f"unexpected Response return code {response.returncode}")
         return response
 
+    def show_async(self) -> Future[Response]:
+        """
+        same as ``show`` but run in a worker thread, the calling thread is not blocked
+        while whiptail is spawned and displayed.
+
+        async dialogs are queued on a single worker and shown one after another, but a plain
+        ``show`` on another thread still draws over them, don't mix the two.
+        event callbacks (``on_ok``, ``on_selected``, ``on_submit``...) run on the worker thread,
+        a callback waiting on the result of another ``show_async`` deadlocks the worker.
+        """
+        return _get_executor().submit(self.show)
+
     def on_positive_event_triggered(self, value : str) -> None:
         """
         subclass need to override this method if needed
@@ -251,69 +389,67 @@ class WhiptailBase:
         """
         raise Exception("on_esc_event_triggered not implemented!")
         pass
-    
-    def set_clear_on_exit(self) -> Type[self]:
+
+    def set_clear_on_exit(self) -> Self:
         self.clear_on_exit = True
         return self
 
-    def set_default_no(self) -> Type[self]:
+    def set_default_no(self) -> Self:
         self.default_no = True
         return self
 
-    def set_default_item(self, default_item : str) -> Type[self]:
+    def set_default_item(self, default_item : str) -> Self:
         self.default_item = default_item
         return self
 
-    def set_full_buttons(self) -> Type[self]:
+    def set_full_buttons(self) -> Self:
         self.full_buttons = True
         return self
 
-    def set_no_cancel(self) -> Type[self]:
+    def set_no_cancel(self) -> Self:
         self.no_cancel = True
         return self
-        
-    def set_yes_button(self, yes_button : str) -> Type[self]:
+
+    def set_yes_button(self, yes_button : str) -> Self:
         self.yes_button = yes_button
         return self
 
-    def set_no_button(self, no_button : str) -> Type[self]:
+    def set_no_button(self, no_button : str) -> Self:
         self.no_button = no_button
         return self
 
-    def set_ok_button(self, ok_button : str) -> Type[self]:
+    def set_ok_button(self, ok_button : str) -> Self:
         self.ok_button = ok_button
         return self
 
-    def set_cancel_button(self, cancel_button : str) -> Type[self]:
+    def set_cancel_button(self, cancel_button : str) -> Self:
         self.cancel_button = cancel_button
         return self
 
-    def set_no_item(self) -> Type[self]:
+    def set_no_item(self) -> Self:
         self.no_item = True
         return self
 
-    def set_no_tags(self) -> Type[self]:
+    def set_no_tags(self) -> Self:
         self.no_tags = True
         return self
 
-    def set_separate_output(self) -> Type[self]:
+    def set_separate_output(self) -> Self:
         self.separate_output = True
         return self
 
-    def set_title(self, title : str) -> Type[self]:
+    def set_title(self, title : str) -> Self:
         self.title = title
         return self
 
-    def set_backtitle(self, backtitle : str) -> Type[self]:
+    def set_backtitle(self, backtitle : str) -> Self:
         self.backtitle = backtitle
         return self
 
-    def set_scrolltext(self) -> Type[self]:
+    def set_scrolltext(self) -> Self:
         self.scrolltext = True
         return self
-    
-    def set_topleft(self) -> Type[self]:
+
+    def set_topleft(self) -> Self:
         self.topleft = True
         return self
-
-
@@ -5,15 +5,56 @@
 # stdlib
 from __future__ import annotations
 from typing import Optional, Sequence, Type, Callable, Any
-import itertools
+import functools
 import re
 import threading
-import subprocess
 # third part
-from .whiptail_base import Response, WhiptailBase, POSITIVE_RETURN_CODE
+from .whiptail_base import Response, WhiptailBase, POSITIVE_RETURN_CODE, Self
 
 DEFAULT_FORM_ITEM_PLACEHOLDER_LEN : int = 20
 
+@functools.lru_cache(maxsize=64)
+def _mask(length : int) -> str:
+    """
+    mask string displayed in place of a password of ``length`` characters
+    """
+    return length * '*'
+
+# every line a gauge can be fed with, encoded once
+_GAUGE_FRAMES : tuple[bytes, ...] = tuple(b"%d\n" % percent for percent in range(101))
+
+# checklist output is a list of double quoted keys
+_QUOTED_RE = re.compile(r'"([^"]*)"')
+
+def _index_items_by_key(items : Sequence[Any], message : str) -> dict[str, Any]:
+    """
+    map item keys to items, raise an exception with ``message`` as soon as a duplicated item key is met
+    """
+    items_by_key = {}
+    for item in items:
+        if item.key in items_by_key:
+            raise Exception(message)
+        items_by_key[item.key] = item
+    return items_by_key
+
+def _build_select_item_args(
+    list_height : int,
+    items : Sequence[WhiptailSelectItem],
+    prefix : str,
+    description : bool) -> list[str]:
+    """
+    build ``<listheight> [tag item status]...`` args of checklist and radiolist boxes.
+    the list is allocated at its final size and filled column by column,
+    the item column stays empty unless description is enabled
+    """
+    args = [''] * (1 + 3 * len(items))
+    args[0] = str(list_height)
+    args[1::3] = [item.key for item in items]
+    if description:
+        args[2::3] = [f'{prefix} {item.description}' for item in items]
+    args[3::3] = ["ON" if item.selected else "OFF" for item in items]
+    return args
+
 class WhiptailMessageBox(WhiptailBase):
     """
     Message box is used to display text message, it has only an ``ok`` button.
@@ -21,6 +62,8 @@ class WhiptailMessageBox(WhiptailBase):
     :param message: the text message to display
     :param on_ok: event to trigger when ok button is pushed
     """
+    __slots__ = ('on_ok',)
+
     def __init__(self,
         message : str,
         height : Optional[int],
@@ -52,6 +95,8 @@ class WhiptailYesNo(WhiptailBase):
 
     :param message: The message to display in the dialog box
     """
+    __slots__ = ('on_yes', 'on_no')
+
     def __init__(self,
         message : str,
         height : Optional[int],
@@ -88,6 +133,8 @@ class WhiptailInfoBox(WhiptailBase):
 
     :param message: The message to display in the dialog box
     """
+    __slots__ = ()
+
     def __init__(self,
         message : str,
         height : Optional[int],
@@ -114,6 +161,8 @@ class WhiptailTextBox(WhiptailBase):
     :param on_ok: event to trigger when ok button is pushed
     :param on_failed: event to trigger when file is failed to open
     """
+    __slots__ = ('on_ok', 'on_failed')
+
     def __init__(self,
         textfile : str,
         height : Optional[int],
@@ -151,6 +200,8 @@ class WhiptailMenuItem:
     :param data: The payload to be passed to ``on_selected`` callback function.
     :param on_selected: Event callback function to be triggered when the item is selected. 
     """
+    __slots__ = ('key', 'description', 'data', 'on_selected')
+
     def __init__(
         self,
         key : str,
@@ -183,6 +234,8 @@ class WhiptailMenuBox(WhiptailBase):
     :param items: A sequence of WhiptailMenuItem, you can config the text and event in this struct.
     :param on_cancel: The event callback to be trigger when menu canceled with nothing selected.
     """
+    __slots__ = ('prefix', 'description', 'items', 'on_cancel', '_items_by_key')
+
     def __init__(
         self,
         message : str,
@@ -195,26 +248,33 @@ class WhiptailMenuBox(WhiptailBase):
         super().__init__(box = 'menu', text = message, height = height, width = width)
         self.prefix = prefix
         self.description = description
-        self.items = items
+        # snapshot items, box extra args are built lazily and must match the key check below
+        self.items = tuple(items)
         self.on_cancel = on_cancel
         # validate items have unique key
-        if len(set([item.key for item in self.items])) != len(self.items):
-            raise Exception("menu items must have unique key!")
-        # build box extra args
-        menu_item_args = [(item.key, '{} {}'.format(self.prefix, item.description) \
-            if self.description else '') for item in self.items]
-        menu_item_args = list(itertools.chain.from_iterable(menu_item_args)) # flatten the list
-        self.box_extra_args = [str(self.get_default_list_height())] + menu_item_args
+        self._items_by_key = _index_items_by_key(self.items, "menu items must have unique key!")
+
+    def build_box_extra_args(self) -> list[str]:
+        """
+        menu args are ``<listheight> [tag item]...``, item column stays empty without description
+        """
+        items = self.items
+        box_extra_args = [''] * (1 + 2 * len(items))
+        box_extra_args[0] = str(self.get_default_list_height())
+        box_extra_args[1::2] = [item.key for item in items]
+        if self.description:
+            prefix = self.prefix
+            box_extra_args[2::2] = [f'{prefix} {item.description}' for item in items]
+        return box_extra_args
 
     def on_positive_event_triggered(self, value : str) -> None:
         """
         triggered when item selected, bind it to ``on_selected`` of corresponding WhiptailMenuItem
         """
-        for item in self.items:
-            if item.key == value:
-                item.on_selected(item.data)
-                return
-        raise Exception(f"no items found! key = {value}")
+        item = self._items_by_key.get(value)
+        if item is None:
+            raise Exception(f"no items found! key = {value}")
+        item.on_selected(item.data)
 
     def on_negative_event_triggered(self) -> None:
         """
@@ -243,6 +303,8 @@ class WhiptailInputBox(WhiptailBase):
     :param validator: Check if the input is valid, if it's invalid, input box will forbid to submit
     :param error_message: Message to display if input is not invalid. 
     """
+    __slots__ = ('placeholder', 'password', 'validator', 'error_message', 'on_submit', 'on_cancel', '_error_box')
+
     def __init__(
         self,
         message : str,
@@ -264,6 +326,8 @@ class WhiptailInputBox(WhiptailBase):
         self.on_cancel      : Callable[[], Any]        = on_cancel
         # build box extra args
         self.box_extra_args = [self.placeholder]
+        # message box popped on invalid input, created on first failure and reused afterwards
+        self._error_box : Optional[WhiptailMessageBox] = None
 
     def refresh(self):
         self.show()
@@ -274,12 +338,15 @@ class WhiptailInputBox(WhiptailBase):
         """
         if not self.validator(value):
             # pop a message box to display error message
-            WhiptailMessageBox(
-                message = self.error_message,
-                height = self.height,
-                width = self.width).show()
-            # re-render
+            if self._error_box is None:
+                self._error_box = WhiptailMessageBox(
+                    message = self.error_message,
+                    height = self.height,
+                    width = self.width)
+            self._error_box.show()
+            # re-render, box extra args are unchanged
             self.refresh()
+            return
         self.on_submit(value)
         pass
 
@@ -301,6 +368,8 @@ class WhiptailSelectItem:
     :param description : The menu item description followed by the ``key``,
     only to be shown when WhiptailCheckListBox/WhiptailRadioListBox enable description.
     """
+    __slots__ = ('key', 'description', 'selected')
+
     def __init__(
         self,
         key : str,
@@ -321,6 +390,8 @@ class WhiptailCheckListBox(WhiptailBase):
     :param items: A sequence of items to display in the checklist
     :param prefix:
     """
+    __slots__ = ('prefix', 'description', 'items', 'on_cancel', 'on_submit')
+
     def __init__(
         self,
         message : str,
@@ -334,24 +405,21 @@ class WhiptailCheckListBox(WhiptailBase):
         super().__init__(box = 'checklist', text = message, height = height, width = width)
         self.prefix = prefix
         self.description = description
-        self.items = items
+        # snapshot items, box extra args are built lazily and must match the key check below
+        self.items = tuple(items)
         self.on_cancel = on_cancel
         self.on_submit = on_submit
         # validate items have unique key
-        if len(set([item.key for item in self.items])) != len(self.items):
-            raise Exception("checkbox list items must have unique key!")
-        # build box extra args
-        menu_item_args = [(item.key, '{} {}'.format(self.prefix, item.description) \
-            if self.description else '', "ON" if item.selected else "OFF") \
-            for item in self.items]
-        menu_item_args = list(itertools.chain.from_iterable(menu_item_args)) # flatten the list
-        self.box_extra_args = [str(self.get_default_list_height())] + menu_item_args
+        _index_items_by_key(self.items, "checkbox list items must have unique key!")
+
+    def build_box_extra_args(self) -> list[str]:
+        return _build_select_item_args(self.get_default_list_height(), self.items, self.prefix, self.description)
 
     def on_positive_event_triggered(self, value : str) -> None:
         """
         triggered when input box ``ok`` button pushed, bind it to ``on_submit``
         """
-        keys = re.findall(r'"([^"]*)"', value)
+        keys = _QUOTED_RE.findall(value)
         self.on_submit(keys)
         pass
 
@@ -373,6 +441,8 @@ class WhiptailRadioListBox(WhiptailBase):
     :param items: A sequence of items to display in the radiolist.
     :param prefix: The prefix string to be show in front of item text.
     """
+    __slots__ = ('prefix', 'description', 'items', 'on_cancel', 'on_submit')
+
     def __init__(
         self,
         message : str,
@@ -386,18 +456,15 @@ class WhiptailRadioListBox(WhiptailBase):
         super().__init__(box = 'radiolist', text = message, height = height, width = width)
         self.prefix = prefix
         self.description = description
-        self.items = items
+        # snapshot items, box extra args are built lazily and must match the key check below
+        self.items = tuple(items)
         self.on_cancel = on_cancel
         self.on_submit = on_submit
         # validate items have unique key
-        if len(set([item.key for item in self.items])) != len(self.items):
-            raise Exception("radiolist list items must have unique key!")
-        # build box extra args
-        menu_item_args = [(item.key, '{} {}'.format(self.prefix, item.description) \
-            if self.description else '', "ON" if item.selected else "OFF") \
-            for item in self.items]
-        menu_item_args = list(itertools.chain.from_iterable(menu_item_args)) # flatten the list
-        self.box_extra_args = [str(self.get_default_list_height())] + menu_item_args
+        _index_items_by_key(self.items, "radiolist list items must have unique key!")
+
+    def build_box_extra_args(self) -> list[str]:
+        return _build_select_item_args(self.get_default_list_height(), self.items, self.prefix, self.description)
 
     def on_positive_event_triggered(self, value : str) -> None:
         """
@@ -422,6 +489,8 @@ class WhiptailFormItem:
     :param password: If is password input
     :param value : The form item value.
     """
+    __slots__ = ('key', 'name', 'password', 'value', 'validator', 'error_message')
+
     def __init__(
         self,
         key : str,
@@ -445,6 +514,11 @@ class WhiptailFormBox(WhiptailBase):
     :param message: The message to display in the dialog box.
     :param items: A sequence of items to display in the radiolist.
     """
+    __slots__ = ('prefix', 'items', 'on_cancel', 'on_submit', 'submit_button', '_index_by_key')
+
+    # box extra args layout: <listheight> [tag value]... followed by the submit entry
+    _ARGS_HEAD : int = 1
+    _ITEM_ARGS : int = 2
     
     def __init__(
         self,
@@ -457,30 +531,46 @@ class WhiptailFormBox(WhiptailBase):
         on_submit : Callable[[list], Any] = lambda _ : None):
         super().__init__(box = 'menu', text = message, height = height, width = width)
         self.prefix = '-'
-        self.items = items
+        # snapshot items, box extra args are built lazily and must match the key check below
+        self.items = tuple(items)
         self.on_cancel = on_cancel
         self.on_submit = on_submit
 
         self.submit_button = submit_button
-        # validate items have unique key
-        if len(set([item.key for item in self.items])) != len(self.items):
-            raise Exception("radiolist list items must have unique key!")
-        # build box extra args
-        menu_item_args = [(item.key, len(item.value) * '*' if item.password else item.value) \
-            for item in self.items]
-        menu_item_args = [(item[0], '{} {}'.format(self.prefix, item[1])) for item in menu_item_args]
-        menu_item_args.append(('', '[{}]'.format(self.submit_button)))
-        menu_item_args = list(itertools.chain.from_iterable(menu_item_args)) # flatten the list
-        self.box_extra_args = [str(self.get_default_list_height())] + menu_item_args
+        # validate items have unique key, keep each item with its index to locate its args
+        self._index_by_key : dict[str, tuple[int, WhiptailFormItem]] = {}
+        for i, item in enumerate(self.items):
+            if item.key in self._index_by_key:
+                raise Exception("form items must have unique key!")
+            self._index_by_key[item.key] = (i, item)
+
+    def _patch_item(self, index : int, item : WhiptailFormItem) -> None:
+        """
+        update only the displayed value of ``item`` at ``index`` in box extra args
+        """
+        value = _mask(len(item.value)) if item.password else item.value
+        self.box_extra_args[self._ARGS_HEAD + self._ITEM_ARGS * index + 1] = f'{self.prefix} {value}'
+
+    def build_box_extra_args(self) -> list[str]:
+        """
+        build box extra args from current form item values, followed by the submit entry
+        """
+        items = self.items
+        head, step = self._ARGS_HEAD, self._ITEM_ARGS
+        end = head + step * len(items)
+        box_extra_args = [''] * (end + step)
+        box_extra_args[0] = str(self.get_default_list_height())
+        box_extra_args[head:end:step] = [item.key for item in items]
+        prefix = self.prefix
+        box_extra_args[head + 1:end:step] = [
+            f'{prefix} {_mask(len(item.value)) if item.password else item.value}' for item in items]
+        # submit entry has an empty tag
+        box_extra_args[-1] = f'[{self.submit_button}]'
+        return box_extra_args
 
     def refresh(self) -> None:
-        # refresh box extra args
-        menu_item_args = [(item.key, len(item.value) * '*' if item.password else item.value) \
-            for item in self.items]
-        menu_item_args = [(item[0], '{} {}'.format(self.prefix, item[1])) for item in menu_item_args]
-        menu_item_args.append(('', '[{}]'.format(self.submit_button)))
-        menu_item_args = list(itertools.chain.from_iterable(menu_item_args)) # flatten the list
-        self.box_extra_args = [str(self.get_default_list_height())] + menu_item_args
+        # drop box extra args, they are rebuilt from items by show()
+        self._box_extra_args = None
         self.show()
         pass
 
@@ -493,22 +583,24 @@ class WhiptailFormBox(WhiptailBase):
             form_data = [{'name' : item.name, 'value' : item.value.strip()} for item in self.items]
             self.on_submit(form_data)
             return
-        for item in self.items:
-            if item.key == menu_key:
-                # create a inputbox to edit value for menu_key
-                response = WhiptailInputBox(
-                    message = item.key,
-                    height = self.height,
-                    width = self.width,
-                    placeholder = item.value.strip(),
-                    password = item.password,
-                    validator = item.validator,
-                    error_message = item.error_message).show()
-                if response.returncode == POSITIVE_RETURN_CODE:
-                    item.value = response.value
-                self.refresh()
-                return
-        raise Exception(f"unknown form key: {value}")
+        indexed_item = self._index_by_key.get(menu_key)
+        if indexed_item is None:
+            raise Exception(f"unknown form key: {value}")
+        index, item = indexed_item
+        # create a inputbox to edit value for menu_key
+        response = WhiptailInputBox(
+            message = item.key,
+            height = self.height,
+            width = self.width,
+            placeholder = item.value.strip(),
+            password = item.password,
+            validator = item.validator,
+            error_message = item.error_message).show()
+        if response.returncode == POSITIVE_RETURN_CODE:
+            item.value = response.value
+            self._patch_item(index, item)
+        # re-render
+        self.show()
 
     def on_negative_event_triggered(self) -> None:
         """
@@ -521,6 +613,7 @@ class WhiptailGaugeBox(WhiptailBase):
     """
     wrap the progress bar box base of whiptail gauge
     """
+    __slots__ = ('percent', 'thread', '_response')
     
     def __init__(self,
         message : str,
@@ -534,38 +627,43 @@ class WhiptailGaugeBox(WhiptailBase):
             raise Exception(f"gauge percent greater than 100! ({percent})")
         self.box_extra_args = [str(percent)]
         self.thread = None
+        self._response : Optional[Response] = None
     
-    def listen(self) -> Type[self]:
-        whiptail_args = self.build_whiptail_args()
-        cmd = []
-        if (self.term_env is not None):
-            cmd = ["TERM={}".format(self.term_env)]
-        cmd += ["whiptail"]
-        cmd += [*list(whiptail_args)]
-        cmd += [
-            "--{}".format(self.box),
-            "--",
-            str(self.text),
-            str(self.height),
-            str(self.width),
-            *list(self.box_extra_args)
-        ]
-        self.process = subprocess.Popen(cmd, stdin = subprocess.PIPE, stderr=subprocess.PIPE, text = True)
-        self.thread = threading.Thread(target = self.start)
+    def listen(self) -> Self:
+        """
+        spawn the gauge process once, percents are then streamed to its stdin by ``update_percent``
+        """
+        self.spawn_streaming()
+        # drain stderr in background so whiptail never blocks on a full pipe
+        self.thread = threading.Thread(target = self.start, daemon = True)
+        self.thread.start()
         return self
 
     def start(self) -> Response:
-        _, err = self.process.communicate()
+        # communicate() would close stdin, read stderr only and leave stdin to update_percent
+        err = self.process.stderr.read()
+        self.process.wait()
         # err is the selected key str
-        return Response(self.process.returncode, err)
+        self._response = Response.from_bytes(self.process.returncode, err)
+        return self._response
 
     def update_percent(self, percent : int) -> None:
-        if percent > 100 or percent < 0:
+        if not 0 <= percent <= 100:
             raise Exception("percent must in 1..100!")
+        # frames are indexed by integer percent, accept float percents like done / total * 100
+        percent = int(percent)
+        # gauge already displays this percent, skip the redundant write
+        if percent == self.percent:
+            return
         self.percent = percent
-        self.process.stdin.write(f"{percent}\n")
-        self.process.stdin.flush()
+        # stdin is unbuffered, every frame is a single write to the pipe. write through the file
+        # object rather than a saved fd number, which the OS may reuse once terminate() closes stdin
+        self.process.stdin.write(_GAUGE_FRAMES[percent])
 
-    def terminate(self) -> None:
+    def terminate(self) -> Response:
+        """
+        close the gauge and wait for whiptail to exit
+        """
         self.process.stdin.close()
-
+        self.thread.join()
+        return self._response